@@ -0,0 +1,104 @@
+"""
+Benchmark CPU cost versus bytes saved for response compression encoders.
+
+Compresses representative payloads (Algolia-style search JSON and a text
+file) chunk by chunk, flushing after each chunk the same way
+CompressionMiddleware streams them, and reports compressed size, ratio and
+throughput for each encoder and level.
+"""
+
+import json
+import random
+import sys
+import time
+
+from compression import BrotliEncoder, GzipEncoder, ZstdEncoder, brotli, zstandard
+
+
+CHUNK_SIZE = 64 * 1024
+ROUNDS = 5
+
+
+def search_payload(hits: int = 500) -> bytes:
+    """Build a search response shaped like AlgoliaService.search output."""
+    rng = random.Random(42)
+    words = ["wireless", "charger", "usb", "cable", "laptop", "stand", "black",
+             "white", "fast", "portable", "compact", "premium", "adapter", "hub"]
+    results = []
+    for i in range(hits):
+        title = " ".join(rng.choice(words) for _ in range(5))
+        results.append({
+            "objectID": str(100000 + i),
+            "title": title,
+            "description": " ".join(rng.choice(words) for _ in range(30)),
+            "price": round(rng.uniform(5, 500), 2),
+            "categories": rng.sample(words, 3),
+            "_highlightResult": {
+                "title": {"value": title, "matchLevel": "full", "matchedWords": ["usb"]}
+            }
+        })
+    response = {"hits": results, "nbHits": hits, "page": 0, "hitsPerPage": hits,
+                "processingTimeMS": 3, "query": "usb"}
+    return json.dumps(response).encode("utf-8")
+
+
+def text_payload(lines: int = 20000) -> bytes:
+    """Build a log-like text object typical of text S3 uploads."""
+    rng = random.Random(7)
+    levels = ["INFO", "DEBUG", "WARNING", "ERROR"]
+    return "".join(
+        f"2024-01-01T00:{i // 60 % 60:02d}:{i % 60:02d}Z {rng.choice(levels)} "
+        f"request_id={rng.getrandbits(64):016x} path=/services/s3/files/{i % 97} "
+        f"status={rng.choice([200, 200, 200, 404, 500])} duration_ms={rng.randint(1, 900)}\n"
+        for i in range(lines)
+    ).encode("utf-8")
+
+
+def encoders():
+    """Yield (name, factory) pairs for every available encoder setting."""
+    for level in (1, 6, 9):
+        yield f"gzip-{level}", lambda level=level: GzipEncoder(level)
+    if brotli is not None:
+        for quality in (1, 4, 6, 8, 11):
+            yield f"br-{quality}", lambda quality=quality: BrotliEncoder(quality)
+    if zstandard is not None:
+        for level in (1, 3, 9, 11, 19):
+            yield f"zstd-{level}", lambda level=level: ZstdEncoder(level)
+
+
+def measure(factory, payload: bytes):
+    """Return (compressed size, best seconds) over ROUNDS streamed runs."""
+    best = float("inf")
+    size = 0
+    for _ in range(ROUNDS):
+        start = time.perf_counter()
+        encoder = factory()
+        size = 0
+        for offset in range(0, len(payload), CHUNK_SIZE):
+            size += len(encoder.compress(payload[offset:offset + CHUNK_SIZE]))
+            if offset + CHUNK_SIZE < len(payload):
+                size += len(encoder.flush())
+        size += len(encoder.finish())
+        best = min(best, time.perf_counter() - start)
+    return size, best
+
+
+def main():
+    """Run the benchmark and print a table per payload."""
+    payloads = [("search JSON", search_payload()), ("text object", text_payload())]
+    for name, payload in payloads:
+        print(f"\n{name}: {len(payload):,} bytes")
+        print(f"{'encoder':<10}{'bytes':>12}{'ratio':>8}{'ms':>10}{'MB/s':>10}")
+        for label, factory in encoders():
+            size, seconds = measure(factory, payload)
+            print(
+                f"{label:<10}{size:>12,}{len(payload) / size:>8.1f}"
+                f"{seconds * 1000:>10.2f}{len(payload) / seconds / 1e6:>10.1f}"
+            )
+    if brotli is None or zstandard is None:
+        print("\nInstall brotli and zstandard to include those encoders.")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
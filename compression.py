@@ -0,0 +1,271 @@
+"""
+Response compression middleware with gzip, brotli and zstd negotiation.
+"""
+
+from typing import Optional, Dict, Iterable, Tuple
+import zlib
+
+from starlette.datastructures import Headers, MutableHeaders
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+
+# Streams that must reach the client event by event are never compressed
+EXCLUDED_CONTENT_TYPES = frozenset({"text/event-stream"})
+
+# Content types compressed by default; any ``text/*`` type is also accepted
+DEFAULT_CONTENT_TYPES = (
+    "application/json",
+    "application/javascript",
+    "application/xml",
+    "application/x-ndjson",
+    "image/svg+xml",
+)
+
+
+class GzipEncoder:
+    """Incremental gzip encoder."""
+    
+    def __init__(self, level: int = 6):
+        self._compressor = zlib.compressobj(level, zlib.DEFLATED, 31)
+    
+    def compress(self, data: bytes) -> bytes:
+        return self._compressor.compress(data)
+    
+    def flush(self) -> bytes:
+        return self._compressor.flush(zlib.Z_SYNC_FLUSH)
+    
+    def finish(self) -> bytes:
+        return self._compressor.flush()
+
+
+class BrotliEncoder:
+    """Incremental brotli encoder (requires the ``brotli`` package)."""
+    
+    def __init__(self, quality: int = 8):
+        self._compressor = brotli.Compressor(quality=quality)
+    
+    def compress(self, data: bytes) -> bytes:
+        return self._compressor.process(data)
+    
+    def flush(self) -> bytes:
+        return self._compressor.flush()
+    
+    def finish(self) -> bytes:
+        return self._compressor.finish()
+
+
+class ZstdEncoder:
+    """Incremental zstd encoder (requires the ``zstandard`` package)."""
+    
+    def __init__(self, level: int = 11):
+        self._compressor = zstandard.ZstdCompressor(level=level).compressobj()
+    
+    def compress(self, data: bytes) -> bytes:
+        return self._compressor.compress(data)
+    
+    def flush(self) -> bytes:
+        return self._compressor.flush(zstandard.COMPRESSOBJ_FLUSH_BLOCK)
+    
+    def finish(self) -> bytes:
+        return self._compressor.flush()
+
+
+def available_encodings() -> Tuple[str, ...]:
+    """Return supported encodings in server preference order."""
+    encodings = []
+    if zstandard is not None:
+        encodings.append("zstd")
+    if brotli is not None:
+        encodings.append("br")
+    encodings.append("gzip")
+    return tuple(encodings)
+
+
+def negotiate_encoding(accept_encoding: str, encodings: Iterable[str]) -> Optional[str]:
+    """
+    Pick the best encoding from an ``Accept-Encoding`` header.
+    
+    Args:
+        accept_encoding: Raw header value, e.g. ``"gzip, br;q=0.9"``
+        encodings: Supported encodings in server preference order
+    
+    Returns:
+        Selected encoding, or None to send the response as-is
+    """
+    weights: Dict[str, float] = {}
+    for item in accept_encoding.split(","):
+        token, _, params = item.strip().partition(";")
+        token = token.strip().lower()
+        if not token:
+            continue
+        weight = 1.0
+        for param in params.split(";"):
+            name, _, value = param.strip().partition("=")
+            if name.strip().lower() == "q":
+                try:
+                    weight = float(value)
+                except ValueError:
+                    weight = 0.0
+        weights[token] = weight
+    
+    best = None
+    best_weight = 0.0
+    for encoding in encodings:
+        weight = weights.get(encoding, weights.get("*", 0.0))
+        if weight > best_weight:
+            best, best_weight = encoding, weight
+    return best
+
+
+class CompressionMiddleware:
+    """
+    ASGI middleware that compresses response bodies on the fly.
+    
+    Bodies are compressed chunk by chunk as the application sends them, and
+    the encoder is flushed after every chunk of a ``StreamingResponse`` so
+    each one reaches the client without waiting for the end of the stream.
+    Responses are passed through untouched when they already carry a
+    ``Content-Encoding`` (such as S3 objects stored compressed), are smaller
+    than ``minimum_size``, are server-sent events or have a content type
+    outside the allowlist.
+    """
+    
+    def __init__(
+        self,
+        app: ASGIApp,
+        minimum_size: int = 500,
+        content_types: Iterable[str] = DEFAULT_CONTENT_TYPES,
+        gzip_level: int = 6,
+        brotli_quality: int = 8,
+        zstd_level: int = 11
+    ):
+        """
+        Initialize compression middleware.
+        
+        Args:
+            app: Wrapped ASGI application
+            minimum_size: Smallest body size in bytes worth compressing
+            content_types: Media types to compress in addition to ``text/*``
+            gzip_level: zlib compression level (1-9)
+            brotli_quality: Brotli quality (0-11)
+            zstd_level: Zstandard compression level (1-22)
+        """
+        self.app = app
+        self.minimum_size = minimum_size
+        self.content_types = frozenset(t.lower() for t in content_types)
+        self.encodings = available_encodings()
+        self._levels = {"gzip": gzip_level, "br": brotli_quality, "zstd": zstd_level}
+    
+    async def __call__(self, scope: Scope, receive: Receive, send: Send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        
+        accept_encoding = Headers(scope=scope).get("accept-encoding", "")
+        encoding = negotiate_encoding(accept_encoding, self.encodings)
+        if encoding is None:
+            await self.app(scope, receive, send)
+            return
+        
+        responder = _CompressionResponder(self, encoding, send)
+        await self.app(scope, receive, responder.send)
+    
+    def create_encoder(self, encoding: str):
+        """Create an incremental encoder for a negotiated encoding."""
+        level = self._levels[encoding]
+        if encoding == "zstd":
+            return ZstdEncoder(level)
+        if encoding == "br":
+            return BrotliEncoder(level)
+        return GzipEncoder(level)
+    
+    def is_compressible(self, headers: Headers) -> bool:
+        """Check whether response headers allow compression."""
+        if "content-encoding" in headers:
+            return False
+        media_type = headers.get("content-type", "").split(";")[0].strip().lower()
+        if media_type in EXCLUDED_CONTENT_TYPES:
+            return False
+        if not (media_type.startswith("text/") or media_type in self.content_types):
+            return False
+        content_length = headers.get("content-length")
+        if content_length is not None and int(content_length) < self.minimum_size:
+            return False
+        return True
+
+
+class _CompressionResponder:
+    """Per-request ``send`` wrapper that decides on and applies compression."""
+    
+    def __init__(self, middleware: CompressionMiddleware, encoding: str, send: Send):
+        self.middleware = middleware
+        self.encoding = encoding
+        self._send = send
+        self._start_message: Optional[Message] = None
+        self._encoder = None
+        self._passthrough = False
+    
+    async def send(self, message: Message):
+        if message["type"] == "http.response.start":
+            # Hold the headers until the first body chunk decides the encoding
+            self._start_message = message
+            return
+        
+        if message["type"] != "http.response.body":
+            await self._flush_start()
+            await self._send(message)
+            return
+        
+        body = message.get("body", b"")
+        more_body = message.get("more_body", False)
+        
+        if self._start_message is not None:
+            start_message = self._start_message
+            headers = MutableHeaders(raw=start_message["headers"])
+            small = not more_body and len(body) < self.middleware.minimum_size
+            if small or not self.middleware.is_compressible(headers):
+                self._passthrough = True
+                await self._flush_start()
+                await self._send(message)
+                return
+            
+            self._encoder = self.middleware.create_encoder(self.encoding)
+            headers["Content-Encoding"] = self.encoding
+            headers.add_vary_header("Accept-Encoding")
+            if "content-length" in headers:
+                del headers["content-length"]
+            data = self._encode(body, more_body)
+            if not more_body:
+                headers["Content-Length"] = str(len(data))
+            await self._flush_start()
+            await self._send({"type": "http.response.body", "body": data, "more_body": more_body})
+            return
+        
+        if self._passthrough:
+            await self._send(message)
+            return
+        
+        data = self._encode(body, more_body)
+        await self._send({"type": "http.response.body", "body": data, "more_body": more_body})
+    
+    def _encode(self, body: bytes, more_body: bool) -> bytes:
+        """Compress a chunk, flushing so it can be decoded before the stream ends."""
+        data = self._encoder.compress(body)
+        if more_body:
+            return data + self._encoder.flush()
+        return data + self._encoder.finish()
+    
+    async def _flush_start(self):
+        if self._start_message is not None:
+            start_message, self._start_message = self._start_message, None
+            await self._send(start_message)
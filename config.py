@@ -25,6 +25,16 @@ class Settings(BaseSettings):
     aws_secret_access_key: Optional[str] = Field(default=None, env="AWS_SECRET_ACCESS_KEY")
     aws_region: str = Field(default="us-east-1", env="AWS_REGION")
     aws_s3_bucket_name: Optional[str] = Field(default=None, env="AWS_S3_BUCKET_NAME")
+    s3_content_prefix: str = Field(default=".cas/", env="S3_CONTENT_PREFIX")
+    s3_digest_cache_size: int = Field(default=10000, env="S3_DIGEST_CACHE_SIZE")
+    s3_index_path: str = Field(default="s3_index.sqlite3", env="S3_INDEX_PATH")
+    s3_index_workers: int = Field(default=8, env="S3_INDEX_WORKERS")
+    
+    # Response compression settings
+    compression_minimum_size: int = Field(default=500, env="COMPRESSION_MINIMUM_SIZE")
+    compression_gzip_level: int = Field(default=6, env="COMPRESSION_GZIP_LEVEL")
+    compression_brotli_quality: int = Field(default=8, env="COMPRESSION_BROTLI_QUALITY")
+    compression_zstd_level: int = Field(default=11, env="COMPRESSION_ZSTD_LEVEL")
     
     # Service health checks
     check_algolia: bool = Field(default=True, env="CHECK_ALGOLIA")
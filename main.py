@@ -3,15 +3,19 @@ FastAPI application with Algolia and AWS S3 integrations.
 Enhanced version with health checks and service status.
 """
 
-from fastapi import FastAPI, HTTPException, Depends
-from fastapi.responses import JSONResponse
+from fastapi import FastAPI, HTTPException, Depends, Query
+from fastapi.responses import JSONResponse, StreamingResponse
 from fastapi.middleware.cors import CORSMiddleware
-from typing import Dict, Any
+from botocore.exceptions import ClientError
+from datetime import datetime
+from typing import Dict, Any, Optional
 import os
 
 from config import settings
+from compression import CompressionMiddleware
 from services.algolia_service import AlgoliaService
 from services.s3_service import S3Service
+from services.s3_index import S3MetadataIndex
 
 app = FastAPI(
     title=settings.app_name,
@@ -28,10 +32,23 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# Response compression (gzip/brotli/zstd negotiated per request)
+app.add_middleware(
+    CompressionMiddleware,
+    minimum_size=settings.compression_minimum_size,
+    gzip_level=settings.compression_gzip_level,
+    brotli_quality=settings.compression_brotli_quality,
+    zstd_level=settings.compression_zstd_level,
+)
+
+# Chunk size used when streaming S3 objects to clients
+S3_STREAM_CHUNK_SIZE = 64 * 1024
+
 
 # Service instances (lazy initialization)
 _algolia_service: AlgoliaService = None
 _s3_service: S3Service = None
+_s3_index: S3MetadataIndex = None
 
 
 def get_algolia_service() -> AlgoliaService:
@@ -50,6 +67,18 @@ def get_s3_service() -> S3Service:
     return _s3_service
 
 
+def get_s3_index() -> S3MetadataIndex:
+    """Get or create S3 metadata index instance."""
+    global _s3_index
+    if _s3_index is None:
+        _s3_index = S3MetadataIndex(
+            get_s3_service(),
+            db_path=settings.s3_index_path,
+            max_workers=settings.s3_index_workers
+        )
+    return _s3_index
+
+
 @app.get("/")
 async def root():
     """Root endpoint."""
@@ -125,6 +154,19 @@ async def algolia_status(algolia: AlgoliaService = Depends(get_algolia_service))
     }
 
 
+@app.get("/services/algolia/search")
+def algolia_search(
+    index_name: str,
+    query: str = "",
+    algolia: AlgoliaService = Depends(get_algolia_service)
+):
+    """Search an Algolia index."""
+    try:
+        return algolia.search(index_name, query)
+    except RuntimeError as e:
+        raise HTTPException(status_code=503, detail=str(e))
+
+
 @app.get("/services/s3/status")
 async def s3_status(s3: S3Service = Depends(get_s3_service)):
     """Get S3 service status."""
@@ -135,6 +177,92 @@ async def s3_status(s3: S3Service = Depends(get_s3_service)):
     }
 
 
+@app.get("/services/s3/objects")
+def list_s3_objects(
+    prefix: str = "",
+    limit: int = Query(default=100, ge=1, le=1000),
+    cursor: Optional[str] = None,
+    index: S3MetadataIndex = Depends(get_s3_index)
+):
+    """List S3 objects from the local metadata index."""
+    try:
+        return index.list_objects(prefix=prefix, limit=limit, cursor=cursor)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+
+@app.get("/services/s3/objects/search")
+def search_s3_objects(
+    prefix: str = "",
+    min_size: Optional[int] = Query(default=None, ge=0),
+    max_size: Optional[int] = Query(default=None, ge=0),
+    modified_after: Optional[datetime] = None,
+    modified_before: Optional[datetime] = None,
+    limit: int = Query(default=100, ge=1, le=1000),
+    cursor: Optional[str] = None,
+    index: S3MetadataIndex = Depends(get_s3_index)
+):
+    """Find S3 objects by size and last-modified time in the metadata index."""
+    try:
+        return index.search(
+            prefix=prefix,
+            min_size=min_size,
+            max_size=max_size,
+            modified_after=modified_after,
+            modified_before=modified_before,
+            limit=limit,
+            cursor=cursor
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+
+@app.post("/services/s3/index/sync")
+def sync_s3_index(
+    prefix: str = "",
+    max_age: Optional[float] = Query(default=None, ge=0),
+    index: S3MetadataIndex = Depends(get_s3_index)
+):
+    """Re-sync the metadata index with the bucket (runs in the threadpool)."""
+    try:
+        return index.sync(prefix=prefix, max_age=max_age)
+    except (RuntimeError, ValueError) as e:
+        raise HTTPException(status_code=503, detail=str(e))
+    except ClientError as e:
+        error_code = e.response.get("Error", {}).get("Code")
+        raise HTTPException(status_code=502, detail=f"S3 error: {error_code}")
+
+
+@app.get("/services/s3/files/{object_key:path}")
+def download_s3_file(object_key: str, s3: S3Service = Depends(get_s3_service)):
+    """Stream an S3 object, keeping its stored Content-Type and Content-Encoding."""
+    try:
+        obj = s3.get_object(object_key)
+    except (RuntimeError, ValueError) as e:
+        raise HTTPException(status_code=503, detail=str(e))
+    except ClientError as e:
+        error_code = e.response.get("Error", {}).get("Code")
+        if error_code in ("NoSuchKey", "404"):
+            raise HTTPException(status_code=404, detail="Object not found")
+        if error_code in ("AccessDenied", "403"):
+            raise HTTPException(status_code=403, detail="Access to object denied")
+        if error_code == "NoSuchBucket":
+            raise HTTPException(status_code=503, detail="Bucket not found")
+        raise HTTPException(status_code=502, detail=f"S3 error: {error_code}")
+    
+    headers = {}
+    if obj.get("ContentEncoding"):
+        # Already compressed at rest; the compression middleware passes it through
+        headers["Content-Encoding"] = obj["ContentEncoding"]
+    if obj.get("ContentLength") is not None:
+        headers["Content-Length"] = str(obj["ContentLength"])
+    return StreamingResponse(
+        obj["Body"].iter_chunks(chunk_size=S3_STREAM_CHUNK_SIZE),
+        media_type=obj.get("ContentType", "application/octet-stream"),
+        headers=headers
+    )
+
+
 @app.get("/info")
 async def app_info():
     """Get application information."""
@@ -2,5 +2,6 @@
 
 from .algolia_service import AlgoliaService
 from .s3_service import S3Service
+from .s3_index import S3MetadataIndex
 
-__all__ = ["AlgoliaService", "S3Service"]
+__all__ = ["AlgoliaService", "S3Service", "S3MetadataIndex"]
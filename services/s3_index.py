@@ -0,0 +1,492 @@
+"""
+Local SQLite metadata index of S3 bucket contents.
+"""
+
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from datetime import datetime, timezone
+from typing import Optional, Callable, Dict, Any, List, Iterable, Set, Tuple
+import base64
+import json
+import os
+import sqlite3
+import threading
+import time
+
+from .s3_service import S3Service
+
+
+# Bumped whenever the schema changes; the index is rebuilt from the bucket
+_SCHEMA_VERSION = 2
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS objects (
+    key TEXT PRIMARY KEY,
+    size INTEGER NOT NULL,
+    etag TEXT NOT NULL,
+    last_modified TEXT NOT NULL,
+    content_key TEXT,
+    generation INTEGER NOT NULL
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS objects_size ON objects (size, key);
+CREATE INDEX IF NOT EXISTS objects_last_modified ON objects (last_modified, key);
+CREATE TABLE IF NOT EXISTS prefixes (
+    prefix TEXT PRIMARY KEY,
+    synced_at REAL NOT NULL
+) WITHOUT ROWID;
+"""
+
+
+def _format_timestamp(value: datetime) -> str:
+    """Normalize a datetime to a sortable UTC ISO-8601 string."""
+    if value.tzinfo is None:
+        value = value.replace(tzinfo=timezone.utc)
+    return value.astimezone(timezone.utc).strftime("%Y-%m-%dT%H:%M:%SZ")
+
+
+def _prefix_bounds(prefix: str) -> Optional[Tuple[str, str]]:
+    """Return the half-open key range covering every key under ``prefix``."""
+    if not prefix:
+        return None
+    return prefix, prefix[:-1] + chr(ord(prefix[-1]) + 1)
+
+
+def _split_point(low: str, high: str) -> Optional[str]:
+    """
+    Return a key strictly between ``low`` and ``high`` to split a listing.
+    
+    Splits on the first differing character, treating everything above
+    ASCII as one bucket since keys are overwhelmingly ASCII.
+    """
+    i = 0
+    while i < len(low) and i < len(high) and low[i] == high[i]:
+        i += 1
+    if i >= len(high):
+        return None
+    lower = ord(low[i]) if i < len(low) else 0x1f
+    upper = min(ord(high[i]), 0x7f)
+    if upper - lower > 1:
+        return low[:i] + chr((lower + upper) // 2)
+    if i >= len(low):
+        return None
+    # Adjacent characters: split above ``low`` one position further in
+    rest = _split_point(low[i + 1:], "\x7f")
+    return low[:i + 1] + rest if rest else None
+
+
+def _encode_cursor(position: List[Any]) -> str:
+    data = json.dumps(position, separators=(",", ":")).encode("utf-8")
+    return base64.urlsafe_b64encode(data).decode("ascii")
+
+
+def _decode_cursor(cursor: str, columns: Tuple[str, ...]) -> List[Any]:
+    """Decode a cursor into one value per sort column, ending with the key."""
+    try:
+        data = base64.b64decode(cursor, altchars=b"-_", validate=True)
+        position = json.loads(data.decode("utf-8"))
+    except (ValueError, UnicodeError) as e:
+        raise ValueError("Invalid pagination cursor") from e
+    if (
+        not isinstance(position, list)
+        or len(position) != len(columns)
+        or not isinstance(position[-1], str)
+        or not position[-1]
+    ):
+        raise ValueError("Invalid pagination cursor")
+    return position
+
+
+class S3MetadataIndex:
+    """SQLite index of object key, size, ETag and last-modified for a bucket."""
+    
+    def __init__(
+        self,
+        s3_service: S3Service,
+        db_path: Optional[str] = None,
+        bucket_name: Optional[str] = None,
+        max_workers: Optional[int] = None
+    ):
+        """
+        Initialize the metadata index.
+        
+        Args:
+            s3_service: S3 service used to list the bucket
+            db_path: Path of the SQLite file
+            bucket_name: S3 bucket name (uses the service default if not provided)
+            max_workers: Number of listing requests run in parallel during a sync
+        """
+        self.s3_service = s3_service
+        self.db_path = db_path or os.getenv("S3_INDEX_PATH", "s3_index.sqlite3")
+        self.bucket_name = bucket_name or s3_service.bucket_name
+        self.max_workers = max_workers or int(os.getenv("S3_INDEX_WORKERS", "8"))
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(self.db_path, check_same_thread=False)
+        self._conn.row_factory = sqlite3.Row
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        if self._conn.execute("PRAGMA user_version").fetchone()[0] != _SCHEMA_VERSION:
+            self._conn.executescript(
+                "DROP TABLE IF EXISTS objects; DROP TABLE IF EXISTS prefixes;"
+            )
+            self._conn.execute(f"PRAGMA user_version = {_SCHEMA_VERSION}")
+        self._conn.executescript(_SCHEMA)
+    
+    def sync(self, prefix: str = "", max_age: Optional[float] = None) -> Dict[str, Any]:
+        """
+        Bring the index up to date with the bucket.
+        
+        Keys directly below ``prefix`` are listed with a delimiter to discover
+        sub-prefixes, which are then listed in full. Every listing is split
+        into key ranges (``StartAfter`` boundaries) whenever a page comes back
+        truncated, so flat buckets and large prefixes are listed in parallel
+        too. Each sub-prefix scan removes indexed keys that were not seen.
+        Sub-prefixes synced less than ``max_age`` seconds ago are skipped, so
+        repeated calls only re-list what is stale. Deduplicated content under
+        the service's ``content_prefix`` is not indexed; pointer keys are
+        recorded with the size and ETag of their content.
+        
+        Args:
+            prefix: Only sync keys starting with this prefix
+            max_age: Skip sub-prefixes synced within this many seconds
+        
+        Returns:
+            Sync statistics dictionary
+        """
+        generation = time.time_ns()
+        content_prefix = self.s3_service.content_prefix
+        with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+            root_count, found = self._scan(executor, [prefix], generation, delimiter="/")
+            sub_prefixes = sorted(
+                p for p in found
+                if not (content_prefix and p.startswith(content_prefix))
+            )
+            self._sweep_root(prefix, sub_prefixes, generation)
+            
+            stale = [p for p in sub_prefixes if self._is_stale(p, max_age)]
+            object_count, _ = self._scan(
+                executor, stale, generation,
+                on_complete=lambda p: self._finish_prefix(p, generation)
+            )
+        
+        return {
+            "prefix": prefix,
+            "prefixes": len(sub_prefixes),
+            "scanned": len(stale),
+            "objects": root_count + object_count
+        }
+    
+    def list_objects(
+        self,
+        prefix: str = "",
+        limit: int = 100,
+        cursor: Optional[str] = None
+    ) -> Dict[str, Any]:
+        """
+        List indexed objects in key order.
+        
+        Args:
+            prefix: Only return keys starting with this prefix
+            limit: Maximum number of objects to return
+            cursor: Cursor returned by a previous call
+        
+        Returns:
+            Dictionary with ``objects`` and ``next_cursor``
+        """
+        return self.search(prefix=prefix, limit=limit, cursor=cursor)
+    
+    def search(
+        self,
+        prefix: str = "",
+        min_size: Optional[int] = None,
+        max_size: Optional[int] = None,
+        modified_after: Optional[datetime] = None,
+        modified_before: Optional[datetime] = None,
+        limit: int = 100,
+        cursor: Optional[str] = None
+    ) -> Dict[str, Any]:
+        """
+        Find indexed objects by prefix, size and last-modified time.
+        
+        Results are ordered by key, except that a size filter orders them by
+        ``(size, key)`` and otherwise a date filter by ``(last_modified, key)``
+        so the matching secondary index drives the query. Cursors are only
+        valid for the same set of filters.
+        
+        Args:
+            prefix: Only return keys starting with this prefix
+            min_size: Minimum object size in bytes (inclusive)
+            max_size: Maximum object size in bytes (inclusive)
+            modified_after: Only objects modified at or after this time
+            modified_before: Only objects modified before this time
+            limit: Maximum number of objects to return
+            cursor: Cursor returned by a previous call
+        
+        Returns:
+            Dictionary with ``objects`` and ``next_cursor``
+        """
+        clauses: List[str] = []
+        params: List[Any] = []
+        bounds = _prefix_bounds(prefix)
+        if bounds:
+            clauses.append("key >= ? AND key < ?")
+            params.extend(bounds)
+        if min_size is not None:
+            clauses.append("size >= ?")
+            params.append(min_size)
+        if max_size is not None:
+            clauses.append("size <= ?")
+            params.append(max_size)
+        if modified_after is not None:
+            clauses.append("last_modified >= ?")
+            params.append(_format_timestamp(modified_after))
+        if modified_before is not None:
+            clauses.append("last_modified < ?")
+            params.append(_format_timestamp(modified_before))
+        if min_size is not None or max_size is not None:
+            columns: Tuple[str, ...] = ("size", "key")
+        elif modified_after is not None or modified_before is not None:
+            columns = ("last_modified", "key")
+        else:
+            columns = ("key",)
+        if cursor:
+            position = _decode_cursor(cursor, columns)
+            placeholders = ", ".join("?" * len(columns))
+            clauses.append(f"({', '.join(columns)}) > ({placeholders})")
+            params.extend(position)
+        
+        query = "SELECT key, size, etag, last_modified FROM objects"
+        if clauses:
+            query += " WHERE " + " AND ".join(clauses)
+        query += f" ORDER BY {', '.join(columns)} LIMIT ?"
+        params.append(limit + 1)
+        
+        with self._lock:
+            rows = self._conn.execute(query, params).fetchall()
+        
+        objects = [dict(row) for row in rows[:limit]]
+        next_cursor = None
+        if len(rows) > limit:
+            next_cursor = _encode_cursor([objects[-1][column] for column in columns])
+        return {"objects": objects, "next_cursor": next_cursor}
+    
+    def upsert(self, key: str, size: int, etag: str, last_modified: datetime):
+        """Record a single object, e.g. right after uploading it."""
+        self._write(
+            [{"Key": key, "Size": size, "ETag": etag, "LastModified": last_modified}],
+            time.time_ns()
+        )
+    
+    def discard(self, key: str):
+        """Remove a single object from the index."""
+        with self._lock, self._conn:
+            self._conn.execute("DELETE FROM objects WHERE key = ?", (key,))
+    
+    def count(self) -> int:
+        """Return the number of indexed objects."""
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM objects").fetchone()[0]
+    
+    def close(self):
+        """Close the underlying SQLite connection."""
+        with self._lock:
+            self._conn.close()
+    
+    def _scan(
+        self,
+        executor: ThreadPoolExecutor,
+        prefixes: List[str],
+        generation: int,
+        delimiter: Optional[str] = None,
+        on_complete: Optional[Callable[[str], None]] = None
+    ) -> Tuple[int, Set[str]]:
+        """
+        List ``prefixes`` page by page, splitting key ranges across workers.
+        
+        Each truncated page hands the upper half of its remaining key range
+        to a new worker, while its own continuation keeps the lower half.
+        Every range tracks the key it has listed past, so splits always land
+        above it and a range is only continued while its listing advances.
+        ``on_complete`` runs once every range of a prefix has finished.
+        
+        Returns:
+            Number of objects written and the common prefixes seen
+        """
+        pending = {}
+        outstanding = {p: 0 for p in prefixes}
+        common_prefixes: Set[str] = set()
+        count = 0
+        
+        def submit(prefix, lower, upper, start_after=None, token=None):
+            future = executor.submit(
+                self._scan_page, prefix, delimiter, upper, start_after, token, generation
+            )
+            pending[future] = (prefix, lower, upper, token)
+            outstanding[prefix] += 1
+        
+        for prefix in prefixes:
+            submit(prefix, prefix, None)
+        
+        while pending:
+            done, _ = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                prefix, lower, upper, previous_token = pending.pop(future)
+                outstanding[prefix] -= 1
+                written, seen, last, token = future.result()
+                count += written
+                common_prefixes.update(seen)
+                # A common prefix spanning ``lower`` can sort below it
+                lower = max(lower, last)
+                if token and token != previous_token:
+                    if len(pending) < self.max_workers * 2:
+                        limit = upper or (_prefix_bounds(prefix) or ("", "\U0010ffff"))[1]
+                        split = _split_point(lower, limit)
+                        if split:
+                            submit(prefix, split, upper, start_after=split)
+                            upper = split
+                    submit(prefix, lower, upper, token=token)
+                elif outstanding[prefix] == 0 and on_complete:
+                    on_complete(prefix)
+        return count, common_prefixes
+    
+    def _scan_page(
+        self,
+        prefix: str,
+        delimiter: Optional[str],
+        upper: Optional[str],
+        start_after: Optional[str],
+        token: Optional[str],
+        generation: int
+    ) -> Tuple[int, List[str], str, Optional[str]]:
+        """List one page up to ``upper`` (inclusive) and write its objects."""
+        page = self.s3_service.list_objects_page(
+            prefix=prefix,
+            delimiter=delimiter,
+            start_after=start_after,
+            continuation_token=token,
+            bucket_name=self.bucket_name
+        )
+        listed = page.get("Contents", [])
+        listed_prefixes = [p["Prefix"] for p in page.get("CommonPrefixes", [])]
+        contents = [c for c in listed if upper is None or c["Key"] <= upper]
+        seen = [p for p in listed_prefixes if upper is None or p <= upper]
+        past_upper = len(contents) < len(listed) or len(seen) < len(listed_prefixes)
+        if start_after:
+            # A common prefix containing ``start_after`` is reported again here;
+            # the range below it already lists that prefix
+            seen = [p for p in seen if p > start_after]
+        
+        written = self._write(contents, generation)
+        last = max([c["Key"] for c in contents[-1:]] + seen[-1:], default=prefix)
+        token = None
+        if page.get("IsTruncated") and not past_upper:
+            token = page.get("NextContinuationToken")
+        return written, seen, last, token
+    
+    def _finish_prefix(self, prefix: str, generation: int):
+        """Drop keys under a fully listed ``prefix`` that were not seen."""
+        with self._lock, self._conn:
+            self._conn.execute(
+                "DELETE FROM objects WHERE key >= ? AND key < ? AND generation < ?",
+                (*_prefix_bounds(prefix), generation)
+            )
+            self._conn.execute(
+                "INSERT OR REPLACE INTO prefixes (prefix, synced_at) VALUES (?, ?)",
+                (prefix, time.time())
+            )
+    
+    def _sweep_root(self, prefix: str, sub_prefixes: List[str], generation: int):
+        """Drop stale keys directly under ``prefix`` and vanished sub-prefixes."""
+        bounds = _prefix_bounds(prefix) or ("", "\U0010ffff")
+        with self._lock, self._conn:
+            self._conn.execute(
+                "DELETE FROM objects WHERE key >= ? AND key < ? AND generation < ? "
+                "AND instr(substr(key, ?), '/') = 0",
+                (*bounds, generation, len(prefix) + 1)
+            )
+            known = [
+                row["prefix"] for row in self._conn.execute(
+                    "SELECT prefix FROM prefixes WHERE prefix >= ? AND prefix < ?",
+                    bounds
+                )
+            ]
+            for gone in set(known) - set(sub_prefixes):
+                # Only direct children of ``prefix`` are discovered here
+                if gone == prefix or "/" in gone[len(prefix):-1]:
+                    continue
+                self._conn.execute(
+                    "DELETE FROM objects WHERE key >= ? AND key < ?",
+                    _prefix_bounds(gone)
+                )
+                self._conn.execute("DELETE FROM prefixes WHERE prefix = ?", (gone,))
+    
+    def _is_stale(self, prefix: str, max_age: Optional[float]) -> bool:
+        """Check whether a sub-prefix needs to be re-listed."""
+        if max_age is None:
+            return True
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT synced_at FROM prefixes WHERE prefix = ?", (prefix,)
+            ).fetchone()
+        return row is None or time.time() - row["synced_at"] > max_age
+    
+    def _write(self, contents: Iterable[Dict[str, Any]], generation: int) -> int:
+        """Upsert a batch of ListObjectsV2 ``Contents`` entries."""
+        content_prefix = self.s3_service.content_prefix
+        rows = []
+        for item in contents:
+            key = item["Key"]
+            if content_prefix and key.startswith(content_prefix):
+                continue
+            last_modified = _format_timestamp(item["LastModified"])
+            size, etag, content_key = item["Size"], item["ETag"].strip('"'), None
+            if size == 0:
+                # Possibly a deduplication pointer; index its content instead
+                resolved = self._resolve_pointer(key, last_modified, etag)
+                if resolved is None:
+                    continue
+                size, etag, content_key = resolved
+            rows.append((key, size, etag, last_modified, content_key, generation))
+        if not rows:
+            return 0
+        with self._lock, self._conn:
+            self._conn.executemany(
+                "INSERT INTO objects "
+                "(key, size, etag, last_modified, content_key, generation) "
+                "VALUES (?, ?, ?, ?, ?, ?) ON CONFLICT (key) DO UPDATE SET "
+                "size = excluded.size, etag = excluded.etag, "
+                "last_modified = excluded.last_modified, "
+                "content_key = excluded.content_key, "
+                "generation = excluded.generation",
+                rows
+            )
+        return len(rows)
+    
+    def _resolve_pointer(
+        self,
+        key: str,
+        last_modified: str,
+        etag: str
+    ) -> Optional[Tuple[int, str, Optional[str]]]:
+        """Return size, ETag and content key for an empty object, or None if gone."""
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT size, etag, last_modified, content_key FROM objects WHERE key = ?",
+                (key,)
+            ).fetchone()
+        # Pointers are immutable once written, so an unchanged one needs no HEAD
+        if row is not None and row["last_modified"] == last_modified:
+            return row["size"], row["etag"], row["content_key"]
+        
+        from botocore.exceptions import ClientError
+        try:
+            head = self.s3_service.head_object(key, bucket_name=self.bucket_name)
+        except ClientError as e:
+            error_code = e.response.get("Error", {}).get("Code")
+            if error_code in ("404", "NoSuchKey", "NotFound"):
+                # Deleted since it was listed; the next sync sweeps any old row
+                return None
+            if error_code in ("403", "AccessDenied"):
+                return 0, etag, None
+            raise
+        if "ContentKey" not in head:
+            return 0, etag, None
+        return head["ContentLength"], head["ETag"].strip('"'), head["ContentKey"]
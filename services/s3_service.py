@@ -2,8 +2,51 @@
 AWS S3 service integration.
 """
 
-from typing import Optional, BinaryIO, Dict, Any
+from collections import OrderedDict
+from typing import Optional, BinaryIO, Dict, Any, Tuple
+import hashlib
 import os
+import threading
+import uuid
+
+
+# Chunk size used when hashing seekable streams ahead of an upload
+HASH_CHUNK_SIZE = 1024 * 1024
+
+
+class _HashingReader:
+    """File-like wrapper that hashes bytes as they are read."""
+    
+    def __init__(self, file_obj: BinaryIO):
+        self._file_obj = file_obj
+        self._hash = hashlib.sha256()
+    
+    def read(self, size: int = -1) -> bytes:
+        chunk = self._file_obj.read(size)
+        self._hash.update(chunk)
+        return chunk
+    
+    def hexdigest(self) -> str:
+        return self._hash.hexdigest()
+
+
+def _is_seekable(file_obj: BinaryIO) -> bool:
+    """Check whether a file-like object can be rewound after hashing."""
+    seekable = getattr(file_obj, "seekable", None)
+    if seekable is not None:
+        try:
+            return bool(seekable())
+        except (OSError, ValueError):
+            return False
+    # SpooledTemporaryFile only gained seekable() in Python 3.11; probe
+    # seek/tell directly like s3transfer.utils.seekable does
+    if hasattr(file_obj, "seek") and hasattr(file_obj, "tell"):
+        try:
+            file_obj.seek(file_obj.tell())
+            return True
+        except (OSError, ValueError):
+            return False
+    return False
 
 
 class S3Service:
@@ -14,7 +57,9 @@ class S3Service:
         bucket_name: Optional[str] = None,
         aws_access_key_id: Optional[str] = None,
         aws_secret_access_key: Optional[str] = None,
-        region_name: Optional[str] = None
+        region_name: Optional[str] = None,
+        content_prefix: Optional[str] = None,
+        digest_cache_size: Optional[int] = None
     ):
         """
         Initialize S3 service.
@@ -24,8 +69,16 @@ class S3Service:
             aws_access_key_id: AWS access key ID
             aws_secret_access_key: AWS secret access key
             region_name: AWS region name
+            content_prefix: Key prefix for content-addressed objects
+            digest_cache_size: Number of known content digests kept in memory
         """
         self.bucket_name = bucket_name or os.getenv("AWS_S3_BUCKET_NAME")
+        self.content_prefix = content_prefix or os.getenv("S3_CONTENT_PREFIX", ".cas/")
+        self.digest_cache_size = digest_cache_size or int(
+            os.getenv("S3_DIGEST_CACHE_SIZE", "10000")
+        )
+        self._known_digests: "OrderedDict[Tuple[str, str], None]" = OrderedDict()
+        self._digest_lock = threading.Lock()
         self._s3_client = None
         
         if aws_access_key_id and aws_secret_access_key:
@@ -61,15 +114,28 @@ class S3Service:
         self,
         file_obj: BinaryIO,
         object_key: str,
-        bucket_name: Optional[str] = None
+        bucket_name: Optional[str] = None,
+        deduplicate: bool = False,
+        extra_args: Optional[Dict[str, Any]] = None
     ) -> Dict[str, Any]:
         """
         Upload a file to S3.
         
+        With ``deduplicate`` enabled the content is stored once under a
+        SHA-256 key below ``content_prefix`` and ``object_key`` becomes a
+        pointer to it. Seekable streams are hashed chunk by chunk first, so
+        byte-identical content is never transferred again. Non-seekable
+        streams are hashed while uploading to a staging key, which is then
+        promoted with a server-side copy or dropped if the content exists.
+        
         Args:
             file_obj: File-like object to upload
             object_key: S3 object key (path)
             bucket_name: S3 bucket name (uses default if not provided)
+            deduplicate: Store content by digest and skip repeat transfers
+            extra_args: Upload arguments such as ``ContentType`` or
+                ``ContentEncoding``; applied to the content object when
+                deduplicating
             
         Returns:
             Response dictionary
@@ -81,9 +147,138 @@ class S3Service:
         if not bucket:
             raise ValueError("Bucket name must be provided")
         
-        self._s3_client.upload_fileobj(file_obj, bucket, object_key)
+        if deduplicate:
+            return self._upload_deduplicated(file_obj, object_key, bucket, extra_args)
+        
+        self._s3_client.upload_fileobj(file_obj, bucket, object_key, ExtraArgs=extra_args)
         return {"status": "success", "bucket": bucket, "key": object_key}
     
+    def _upload_deduplicated(
+        self,
+        file_obj: BinaryIO,
+        object_key: str,
+        bucket: str,
+        extra_args: Optional[Dict[str, Any]] = None
+    ) -> Dict[str, Any]:
+        """Upload content under its digest and point ``object_key`` at it."""
+        if _is_seekable(file_obj):
+            start = file_obj.tell()
+            digest = hashlib.sha256()
+            for chunk in iter(lambda: file_obj.read(HASH_CHUNK_SIZE), b""):
+                digest.update(chunk)
+            sha256 = digest.hexdigest()
+            content_key = self._content_key(sha256)
+            exists = self._content_exists(bucket, content_key)
+            if not exists:
+                file_obj.seek(start)
+                self._s3_client.upload_fileobj(
+                    file_obj, bucket, content_key, ExtraArgs=extra_args
+                )
+            transferred = not exists
+        else:
+            staging_key = f"{self.content_prefix}staging/{uuid.uuid4().hex}"
+            reader = _HashingReader(file_obj)
+            self._s3_client.upload_fileobj(
+                reader, bucket, staging_key, ExtraArgs=extra_args
+            )
+            sha256 = reader.hexdigest()
+            content_key = self._content_key(sha256)
+            try:
+                exists = self._content_exists(bucket, content_key)
+                if not exists:
+                    # Managed copy switches to multipart above the 5 GB
+                    # CopyObject limit; multipart copies do not carry over
+                    # headers, so they are passed again explicitly
+                    copy_args = dict(extra_args or {})
+                    if copy_args:
+                        copy_args["MetadataDirective"] = "REPLACE"
+                    self._s3_client.copy(
+                        {"Bucket": bucket, "Key": staging_key},
+                        bucket,
+                        content_key,
+                        ExtraArgs=copy_args or None
+                    )
+            finally:
+                self._s3_client.delete_object(Bucket=bucket, Key=staging_key)
+            transferred = True
+        
+        self._remember_digest(bucket, content_key)
+        self._s3_client.put_object(
+            Bucket=bucket,
+            Key=object_key,
+            Body=b"",
+            Metadata={"content-key": content_key, "content-sha256": sha256}
+        )
+        return {
+            "status": "success",
+            "bucket": bucket,
+            "key": object_key,
+            "content_key": content_key,
+            "sha256": sha256,
+            "deduplicated": exists,
+            "transferred": transferred
+        }
+    
+    def _content_key(self, sha256: str) -> str:
+        """Build the content-addressed key for a SHA-256 hex digest."""
+        return f"{self.content_prefix}{sha256[:2]}/{sha256}"
+    
+    def _content_exists(self, bucket: str, content_key: str) -> bool:
+        """Check the local digest index, falling back to a HEAD request."""
+        with self._digest_lock:
+            if (bucket, content_key) in self._known_digests:
+                self._known_digests.move_to_end((bucket, content_key))
+                return True
+        
+        from botocore.exceptions import ClientError
+        try:
+            self._s3_client.head_object(Bucket=bucket, Key=content_key)
+        except ClientError as e:
+            if e.response.get("Error", {}).get("Code") in ("404", "NoSuchKey", "NotFound"):
+                return False
+            raise
+        self._remember_digest(bucket, content_key)
+        return True
+    
+    def _remember_digest(self, bucket: str, content_key: str):
+        """Record a known content key, evicting the least recently used."""
+        with self._digest_lock:
+            self._known_digests[(bucket, content_key)] = None
+            self._known_digests.move_to_end((bucket, content_key))
+            while len(self._known_digests) > self.digest_cache_size:
+                self._known_digests.popitem(last=False)
+    
+    def get_object(
+        self,
+        object_key: str,
+        bucket_name: Optional[str] = None
+    ) -> Dict[str, Any]:
+        """
+        Open an S3 object for streaming.
+        
+        Args:
+            object_key: S3 object key (path)
+            bucket_name: S3 bucket name (uses default if not provided)
+            
+        Returns:
+            GetObject response with a streaming ``Body`` and stored
+            ``ContentType``/``ContentEncoding``
+        """
+        if not self._s3_client:
+            raise RuntimeError("S3 client not initialized")
+        
+        bucket = bucket_name or self.bucket_name
+        if not bucket:
+            raise ValueError("Bucket name must be provided")
+        
+        response = self._s3_client.get_object(Bucket=bucket, Key=object_key)
+        content_key = response.get('Metadata', {}).get('content-key')
+        if content_key:
+            # Deduplicated upload: follow the pointer to the stored content
+            response['Body'].close()
+            response = self._s3_client.get_object(Bucket=bucket, Key=content_key)
+        return response
+    
     def download_file(
         self,
         object_key: str,
@@ -99,6 +294,29 @@ class S3Service:
         Returns:
             File contents as bytes
         """
+        return self.get_object(object_key, bucket_name)['Body'].read()
+    
+    def list_objects_page(
+        self,
+        prefix: str = "",
+        delimiter: Optional[str] = None,
+        start_after: Optional[str] = None,
+        continuation_token: Optional[str] = None,
+        bucket_name: Optional[str] = None
+    ) -> Dict[str, Any]:
+        """
+        Fetch a single ListObjectsV2 response page.
+        
+        Args:
+            prefix: Only list keys starting with this prefix
+            delimiter: Group keys sharing a prefix up to this delimiter
+            start_after: Only list keys after this key
+            continuation_token: Token from a previous truncated page
+            bucket_name: S3 bucket name (uses default if not provided)
+            
+        Returns:
+            Response page with ``Contents``/``CommonPrefixes``
+        """
         if not self._s3_client:
             raise RuntimeError("S3 client not initialized")
         
@@ -106,8 +324,44 @@ class S3Service:
         if not bucket:
             raise ValueError("Bucket name must be provided")
         
-        response = self._s3_client.get_object(Bucket=bucket, Key=object_key)
-        return response['Body'].read()
+        params = {"Bucket": bucket, "Prefix": prefix}
+        if delimiter:
+            params["Delimiter"] = delimiter
+        if continuation_token:
+            params["ContinuationToken"] = continuation_token
+        elif start_after:
+            params["StartAfter"] = start_after
+        return self._s3_client.list_objects_v2(**params)
+    
+    def head_object(
+        self,
+        object_key: str,
+        bucket_name: Optional[str] = None
+    ) -> Dict[str, Any]:
+        """
+        Fetch object metadata, following deduplication pointers.
+        
+        Args:
+            object_key: S3 object key (path)
+            bucket_name: S3 bucket name (uses default if not provided)
+            
+        Returns:
+            HeadObject response; for pointers it describes the content
+            object and ``ContentKey`` names it
+        """
+        if not self._s3_client:
+            raise RuntimeError("S3 client not initialized")
+        
+        bucket = bucket_name or self.bucket_name
+        if not bucket:
+            raise ValueError("Bucket name must be provided")
+        
+        response = self._s3_client.head_object(Bucket=bucket, Key=object_key)
+        content_key = response.get('Metadata', {}).get('content-key')
+        if content_key:
+            response = self._s3_client.head_object(Bucket=bucket, Key=content_key)
+            response['ContentKey'] = content_key
+        return response
     
     def is_configured(self) -> bool:
         """Check if S3 is properly configured."""
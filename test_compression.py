@@ -0,0 +1,166 @@
+"""
+Tests for the response compression middleware.
+"""
+
+import asyncio
+import gzip
+import sys
+import zlib
+
+from botocore.exceptions import ClientError
+from fastapi import FastAPI
+from fastapi.responses import PlainTextResponse, Response, StreamingResponse
+from fastapi.testclient import TestClient
+
+from compression import CompressionMiddleware, brotli, negotiate_encoding, zstandard
+
+
+def test_negotiate_encoding():
+    """q-values, wildcards and server preference decide the encoding."""
+    supported = ("zstd", "br", "gzip")
+    assert negotiate_encoding("gzip", supported) == "gzip"
+    assert negotiate_encoding("gzip, br", supported) == "br"
+    assert negotiate_encoding("gzip;q=1.0, br;q=0.5", supported) == "gzip"
+    assert negotiate_encoding("br;q=0, gzip;q=0.1", supported) == "gzip"
+    assert negotiate_encoding("*", supported) == "zstd"
+    assert negotiate_encoding("*;q=0.5, zstd;q=0", supported) == "br"
+    assert negotiate_encoding("identity", supported) is None
+    assert negotiate_encoding("", supported) is None
+    assert negotiate_encoding("gzip;q=abc", supported) is None
+    print("✓ Encoding negotiation honours q-values")
+
+
+def _client():
+    app = FastAPI()
+    app.add_middleware(CompressionMiddleware, minimum_size=500)
+    
+    @app.get("/small")
+    def small():
+        return PlainTextResponse("x" * 100)
+    
+    @app.get("/large")
+    def large():
+        return PlainTextResponse("x" * 5000)
+    
+    @app.get("/encoded")
+    def encoded():
+        return Response(
+            gzip.compress(b"x" * 5000),
+            media_type="text/plain",
+            headers={"Content-Encoding": "gzip"}
+        )
+    
+    @app.get("/binary")
+    def binary():
+        return Response(b"\0" * 5000, media_type="application/octet-stream")
+    
+    @app.get("/events")
+    def events():
+        return StreamingResponse(iter([b"data: x\n\n" * 100] * 3), media_type="text/event-stream")
+    
+    return TestClient(app)
+
+
+def test_pass_through_rules():
+    """Small, pre-encoded, non-allowlisted and SSE responses are untouched."""
+    client = _client()
+    headers = {"Accept-Encoding": "gzip"}
+    
+    response = client.get("/large", headers=headers)
+    assert response.headers["content-encoding"] == "gzip"
+    assert int(response.headers["content-length"]) < 5000
+    assert response.text == "x" * 5000
+    
+    assert "content-encoding" not in client.get("/small", headers=headers).headers
+    assert "content-encoding" not in client.get("/binary", headers=headers).headers
+    assert "content-encoding" not in client.get("/events", headers=headers).headers
+    
+    response = client.get("/encoded", headers=headers)
+    assert response.headers["content-encoding"] == "gzip"
+    assert response.text == "x" * 5000
+    print("✓ Pass-through rules respected")
+
+
+def _decoder(encoding: str):
+    if encoding == "gzip":
+        return zlib.decompressobj(31).decompress
+    if encoding == "br":
+        return brotli.Decompressor().process
+    return zstandard.ZstdDecompressor().decompressobj().decompress
+
+
+def _stream_through_middleware(encoding: str, chunks):
+    """Run a streaming app through the middleware and collect sent messages."""
+    async def app(scope, receive, send):
+        await send({
+            "type": "http.response.start",
+            "status": 200,
+            "headers": [(b"content-type", b"application/x-ndjson")]
+        })
+        for chunk in chunks:
+            await send({"type": "http.response.body", "body": chunk, "more_body": True})
+        await send({"type": "http.response.body", "body": b"", "more_body": False})
+    
+    messages = []
+    
+    async def send(message):
+        messages.append(message)
+    
+    async def receive():
+        return {"type": "http.request", "body": b"", "more_body": False}
+    
+    scope = {"type": "http", "headers": [(b"accept-encoding", encoding.encode())]}
+    asyncio.run(CompressionMiddleware(app)(scope, receive, send))
+    return messages
+
+
+def test_streaming_chunks_decode_before_end():
+    """Every streamed chunk is decodable as soon as it is sent."""
+    encodings = ["gzip"]
+    if brotli is not None:
+        encodings.append("br")
+    if zstandard is not None:
+        encodings.append("zstd")
+    chunks = [b'{"line": %d, "value": "%s"}\n' % (i, b"v" * 400) for i in range(20)]
+    
+    for encoding in encodings:
+        messages = _stream_through_middleware(encoding, chunks)
+        start, bodies = messages[0], messages[1:]
+        assert (b"content-encoding", encoding.encode()) in start["headers"]
+        decode = _decoder(encoding)
+        for chunk, message in zip(chunks, bodies):
+            assert message["more_body"]
+            assert decode(message["body"]) == chunk
+        assert not bodies[-1]["more_body"]
+    print("✓ Streamed chunks are flushed as they arrive")
+
+
+def test_s3_file_errors_map_to_status():
+    """S3 client errors on file download map to HTTP status codes."""
+    import main
+    
+    class FailingS3:
+        def __init__(self, code):
+            self.code = code
+        
+        def get_object(self, object_key):
+            raise ClientError({"Error": {"Code": self.code}}, "GetObject")
+    
+    client = TestClient(main.app)
+    try:
+        for code, status in [("NoSuchKey", 404), ("AccessDenied", 403),
+                             ("NoSuchBucket", 503), ("SlowDown", 502)]:
+            main.app.dependency_overrides[main.get_s3_service] = lambda: FailingS3(code)
+            assert client.get("/services/s3/files/a.txt").status_code == status
+    finally:
+        main.app.dependency_overrides.clear()
+    print("✓ S3 download errors map to HTTP status codes")
+
+
+if __name__ == "__main__":
+    test_negotiate_encoding()
+    test_pass_through_rules()
+    test_streaming_chunks_decode_before_end()
+    test_s3_file_errors_map_to_status()
+    print("\n✓ Compression middleware tests passed!")
+    sys.exit(0)
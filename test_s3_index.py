@@ -0,0 +1,301 @@
+"""
+Tests for the S3 metadata index against a fake bucket listing.
+"""
+
+import os
+import sys
+import tempfile
+import threading
+from datetime import datetime, timezone
+
+from botocore.exceptions import ClientError
+
+from services.s3_index import S3MetadataIndex, _split_point
+
+
+class _FakeS3Service:
+    """Serves ListObjectsV2 pages from an in-memory bucket, a few keys per page."""
+    
+    def __init__(self, page_size: int = 3):
+        self.bucket_name = "test-bucket"
+        self.content_prefix = ".cas/"
+        self.page_size = page_size
+        self.objects = {}
+        self.pointers = {}
+        self.calls = []
+        self.heads = 0
+        self.head_errors = {}
+        self._lock = threading.Lock()
+    
+    def put(self, key: str, size: int = 10, day: int = 1):
+        self.objects[key] = {
+            "Key": key,
+            "Size": size,
+            "ETag": f'"etag-{key}"',
+            "LastModified": datetime(2024, 1, day, tzinfo=timezone.utc)
+        }
+    
+    def put_pointer(self, key: str, content_key: str):
+        self.put(key, size=0)
+        self.pointers[key] = content_key
+    
+    def list_objects_page(self, prefix="", delimiter=None, start_after=None,
+                          continuation_token=None, bucket_name=None):
+        with self._lock:
+            self.calls.append((prefix, delimiter, start_after, continuation_token))
+        after = continuation_token or start_after or ""
+        items = []
+        for key in sorted(self.objects):
+            if not key.startswith(prefix) or key <= after:
+                continue
+            rest = key[len(prefix):]
+            if delimiter and delimiter in rest:
+                common = prefix + rest.split(delimiter)[0] + delimiter
+                if items and items[-1] == ("prefix", common):
+                    continue
+                items.append(("prefix", common))
+            else:
+                items.append(("key", key))
+        page, remaining = items[:self.page_size], items[self.page_size:]
+        response = {
+            "Contents": [self.objects[v] for t, v in page if t == "key"],
+            "CommonPrefixes": [{"Prefix": v} for t, v in page if t == "prefix"],
+            "IsTruncated": bool(remaining)
+        }
+        if remaining:
+            kind, value = page[-1]
+            # Resume past every key rolled up into a common prefix
+            response["NextContinuationToken"] = value + "\U0010ffff" if kind == "prefix" else value
+        return response
+    
+    def head_object(self, object_key, bucket_name=None):
+        with self._lock:
+            self.heads += 1
+        if object_key in self.head_errors:
+            raise ClientError({"Error": {"Code": self.head_errors[object_key]}}, "HeadObject")
+        if object_key not in self.pointers:
+            return {"ContentLength": 0, "ETag": self.objects[object_key]["ETag"]}
+        content = self.objects[self.pointers[object_key]]
+        return {
+            "ContentLength": content["Size"],
+            "ETag": content["ETag"],
+            "ContentKey": self.pointers[object_key]
+        }
+
+
+def _index(service):
+    fd, path = tempfile.mkstemp(suffix=".sqlite3")
+    os.close(fd)
+    return S3MetadataIndex(service, db_path=path, max_workers=4), path
+
+
+def _keys(index, **kwargs):
+    return [o["key"] for o in index.search(limit=1000, **kwargs)["objects"]]
+
+
+def test_sync_lists_everything_and_sweeps_deletions():
+    """Full sync matches the bucket; a re-sync removes deleted keys and prefixes."""
+    service = _FakeS3Service()
+    for i in range(20):
+        service.put(f"a/{i:02d}")
+        service.put(f"b/c/{i:02d}")
+    service.put("root.txt")
+    index, path = _index(service)
+    try:
+        stats = index.sync()
+        assert stats["objects"] == 41 and stats["prefixes"] == 2
+        assert _keys(index) == sorted(service.objects)
+        
+        del service.objects["a/00"]
+        del service.objects["root.txt"]
+        for key in [k for k in service.objects if k.startswith("b/")]:
+            del service.objects[key]
+        index.sync()
+        assert _keys(index) == sorted(service.objects)
+    finally:
+        index.close()
+        os.remove(path)
+    print("✓ Sync sweeps deleted keys and prefixes")
+
+
+def test_flat_prefix_is_split_into_ranges():
+    """A large flat listing is split into parallel StartAfter ranges."""
+    service = _FakeS3Service()
+    for i in range(200):
+        service.put(f"flat-{i:04d}")
+    index, path = _index(service)
+    try:
+        index.sync()
+        assert _keys(index) == sorted(service.objects)
+        assert any(start_after for _, _, start_after, _ in service.calls)
+    finally:
+        index.close()
+        os.remove(path)
+    print("✓ Flat listing is split into key ranges")
+
+
+def test_split_point_is_between_bounds():
+    """Split points fall strictly inside the key range."""
+    for low, high in [("a/0001", "a0"), ("flat-0009", "\U0010ffff"), ("ab", "ac"), ("x", "x~")]:
+        split = _split_point(low, high)
+        assert split is None or low < split < high, (low, high, split)
+    print("✓ Split points fall inside the range")
+
+
+def test_split_inside_common_prefix_terminates():
+    """A range starting inside a common prefix does not respawn itself forever."""
+    service = _FakeS3Service(page_size=1)
+    for key in [" ", "!", ")", "/x", "0", "z"]:
+        service.put(key)
+    fd, path = tempfile.mkstemp(suffix=".sqlite3")
+    os.close(fd)
+    index = S3MetadataIndex(service, db_path=path, max_workers=1)
+    try:
+        worker = threading.Thread(target=index.sync, daemon=True)
+        worker.start()
+        worker.join(timeout=5)
+        assert not worker.is_alive(), f"sync still running after {len(service.calls)} calls"
+        assert _keys(index) == sorted(service.objects)
+        assert len(service.calls) < 100
+    finally:
+        index.close()
+        os.remove(path)
+    print("✓ Range split inside a common prefix terminates")
+
+
+def test_max_age_skips_fresh_prefixes():
+    """Prefixes synced within ``max_age`` are not listed again."""
+    service = _FakeS3Service()
+    service.put("a/1")
+    service.put("b/1")
+    index, path = _index(service)
+    try:
+        index.sync()
+        service.calls.clear()
+        stats = index.sync(max_age=3600)
+        assert stats["scanned"] == 0
+        assert all(delimiter == "/" for _, delimiter, _, _ in service.calls)
+        assert index.sync(max_age=0)["scanned"] == 2
+    finally:
+        index.close()
+        os.remove(path)
+    print("✓ max_age skips fresh prefixes")
+
+
+def test_cursor_paging():
+    """Cursors page through results without gaps or repeats; bad cursors fail."""
+    service = _FakeS3Service()
+    for i in range(25):
+        service.put(f"p/{i:02d}")
+    index, path = _index(service)
+    try:
+        index.sync()
+        seen, cursor = [], None
+        while True:
+            page = index.list_objects(prefix="p/", limit=10, cursor=cursor)
+            seen.extend(o["key"] for o in page["objects"])
+            cursor = page["next_cursor"]
+            if cursor is None:
+                break
+        assert seen == sorted(service.objects)
+        
+        for bad in ("%%%", "=", "_w"):
+            try:
+                index.list_objects(cursor=bad)
+            except ValueError:
+                continue
+            raise AssertionError(f"cursor {bad!r} accepted")
+    finally:
+        index.close()
+        os.remove(path)
+    print("✓ Cursor paging works and rejects bad cursors")
+
+
+def test_filtered_search_pages_in_index_order():
+    """Size and date filters page by ``(column, key)`` without gaps or repeats."""
+    service = _FakeS3Service()
+    for i in range(30):
+        service.put(f"f/{i:02d}", size=100 - i % 7, day=1 + i % 5)
+    index, path = _index(service)
+    try:
+        index.sync()
+        for filters, column in [({"min_size": 96}, "size"),
+                                ({"modified_after": datetime(2024, 1, 3)}, "last_modified")]:
+            expected = index.search(limit=1000, **filters)["objects"]
+            assert [(o[column], o["key"]) for o in expected] == sorted(
+                (o[column], o["key"]) for o in expected
+            )
+            seen, cursor = [], None
+            while True:
+                page = index.search(limit=4, cursor=cursor, **filters)
+                seen.extend(page["objects"])
+                cursor = page["next_cursor"]
+                if cursor is None:
+                    break
+            assert seen == expected
+        
+        key_cursor = index.list_objects(limit=1)["next_cursor"]
+        try:
+            index.search(min_size=1, cursor=key_cursor)
+        except ValueError:
+            pass
+        else:
+            raise AssertionError("key cursor accepted for size-ordered search")
+    finally:
+        index.close()
+        os.remove(path)
+    print("✓ Filtered search pages in index order")
+
+
+def test_head_errors_do_not_abort_sync():
+    """Empty keys deleted or forbidden between listing and HEAD are tolerated."""
+    service = _FakeS3Service()
+    service.put("docs/gone.txt", size=0)
+    service.put("docs/locked.txt", size=0)
+    service.put("docs/file.txt")
+    service.head_errors = {"docs/gone.txt": "404", "docs/locked.txt": "AccessDenied"}
+    index, path = _index(service)
+    try:
+        index.sync()
+        assert _keys(index) == ["docs/file.txt", "docs/locked.txt"]
+    finally:
+        index.close()
+        os.remove(path)
+    print("✓ HEAD errors on empty keys do not abort the sync")
+
+
+def test_dedup_objects_indexed_by_content():
+    """Content blobs are skipped and pointers carry their content's size."""
+    service = _FakeS3Service()
+    service.put(".cas/ab/abcdef", size=5500)
+    service.put(".cas/staging/123", size=5500)
+    service.put_pointer("docs/d.txt", ".cas/ab/abcdef")
+    service.put("docs/empty.txt", size=0)
+    index, path = _index(service)
+    try:
+        index.sync()
+        assert _keys(index) == ["docs/d.txt", "docs/empty.txt"]
+        assert _keys(index, max_size=0) == ["docs/empty.txt"]
+        assert _keys(index, min_size=5500) == ["docs/d.txt"]
+        
+        heads = service.heads
+        index.sync()
+        assert service.heads == heads
+    finally:
+        index.close()
+        os.remove(path)
+    print("✓ Deduplicated objects are indexed by their content")
+
+
+if __name__ == "__main__":
+    test_sync_lists_everything_and_sweeps_deletions()
+    test_flat_prefix_is_split_into_ranges()
+    test_split_point_is_between_bounds()
+    test_split_inside_common_prefix_terminates()
+    test_max_age_skips_fresh_prefixes()
+    test_cursor_paging()
+    test_filtered_search_pages_in_index_order()
+    test_head_errors_do_not_abort_sync()
+    test_dedup_objects_indexed_by_content()
+    print("\n✓ S3 metadata index tests passed!")
+    sys.exit(0)
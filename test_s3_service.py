@@ -0,0 +1,161 @@
+"""
+Tests for S3Service deduplicated uploads against a stubbed S3 client.
+"""
+
+import io
+import sys
+
+from botocore.exceptions import ClientError
+
+from services.s3_service import S3Service
+
+
+class _StubS3Client:
+    """In-memory stand-in for the boto3 S3 client calls used by S3Service."""
+    
+    def __init__(self):
+        self.objects = {}
+        self.uploads = []
+        self.heads = 0
+        self.copies = []
+    
+    def upload_fileobj(self, file_obj, bucket, key, ExtraArgs=None):
+        self.uploads.append(key)
+        self.objects[key] = {"Body": file_obj.read(), "Metadata": {}, **(ExtraArgs or {})}
+    
+    def put_object(self, Bucket, Key, Body, Metadata):
+        self.objects[Key] = {"Body": Body, "Metadata": Metadata}
+    
+    def head_object(self, Bucket, Key):
+        self.heads += 1
+        if Key not in self.objects:
+            raise ClientError({"Error": {"Code": "404"}}, "HeadObject")
+        return {"ContentLength": len(self.objects[Key]["Body"])}
+    
+    def copy(self, CopySource, Bucket, Key, ExtraArgs=None):
+        self.copies.append(Key)
+        extra = {k: v for k, v in (ExtraArgs or {}).items() if k != "MetadataDirective"}
+        self.objects[Key] = {**self.objects[CopySource["Key"]], **extra}
+    
+    def delete_object(self, Bucket, Key):
+        del self.objects[Key]
+    
+    def get_object(self, Bucket, Key):
+        stored = self.objects[Key]
+        response = {k: v for k, v in stored.items() if k != "Body"}
+        response["Body"] = io.BytesIO(stored["Body"])
+        return response
+
+
+class _Unseekable:
+    """Non-seekable stream, like a request body."""
+    
+    def __init__(self, data: bytes):
+        self._buffer = io.BytesIO(data)
+    
+    def read(self, size: int = -1) -> bytes:
+        return self._buffer.read(size)
+
+
+class _SeekTellOnly:
+    """Stream with seek/tell but no seekable(), like SpooledTemporaryFile on 3.9."""
+    
+    def __init__(self, data: bytes):
+        self._buffer = io.BytesIO(data)
+    
+    def read(self, size: int = -1) -> bytes:
+        return self._buffer.read(size)
+    
+    def seek(self, offset: int, whence: int = 0) -> int:
+        return self._buffer.seek(offset, whence)
+    
+    def tell(self) -> int:
+        return self._buffer.tell()
+
+
+def _service():
+    service = S3Service(bucket_name="test-bucket")
+    service._s3_client = _StubS3Client()
+    return service, service._s3_client
+
+
+def test_repeat_upload_skips_transfer():
+    """A second seekable upload of identical bytes is not transferred."""
+    service, client = _service()
+    
+    first = service.upload_file(io.BytesIO(b"same bytes"), "a.txt", deduplicate=True)
+    second = service.upload_file(io.BytesIO(b"same bytes"), "b.txt", deduplicate=True)
+    
+    assert first["transferred"] and not first["deduplicated"]
+    assert not second["transferred"] and second["deduplicated"]
+    assert first["content_key"] == second["content_key"]
+    assert client.uploads == [first["content_key"]]
+    # The content key is remembered, so the repeat needs no HEAD request
+    assert client.heads == 1
+    print("✓ Repeat upload skips the transfer")
+
+
+def test_download_follows_pointer():
+    """Downloading a deduplicated key returns the stored content."""
+    service, client = _service()
+    service.upload_file(io.BytesIO(b"payload"), "docs/file.txt", deduplicate=True)
+    
+    assert client.objects["docs/file.txt"]["Body"] == b""
+    assert service.download_file("docs/file.txt") == b"payload"
+    print("✓ Download follows the pointer")
+
+
+def test_unseekable_upload_promotes_staging():
+    """Non-seekable streams are staged, copied once, and the staging key removed."""
+    service, client = _service()
+    
+    first = service.upload_file(
+        _Unseekable(b"streamed"), "s1", deduplicate=True,
+        extra_args={"ContentType": "text/plain", "ContentEncoding": "gzip"}
+    )
+    second = service.upload_file(_Unseekable(b"streamed"), "s2", deduplicate=True)
+    
+    assert client.copies == [first["content_key"]]
+    assert second["deduplicated"]
+    assert not any("/staging/" in key for key in client.objects)
+    stored = service.get_object("s1")
+    assert stored["ContentType"] == "text/plain"
+    assert stored["ContentEncoding"] == "gzip"
+    assert service.download_file("s2") == b"streamed"
+    print("✓ Unseekable upload promotes the staging object")
+
+
+def test_seek_tell_stream_skips_transfer():
+    """Streams without seekable() but with seek/tell avoid the staging path."""
+    service, client = _service()
+    service.upload_file(io.BytesIO(b"upload"), "a.txt", deduplicate=True)
+    
+    result = service.upload_file(_SeekTellOnly(b"upload"), "b.txt", deduplicate=True)
+    
+    assert not result["transferred"] and result["deduplicated"]
+    assert client.copies == []
+    assert len(client.uploads) == 1
+    print("✓ seek/tell streams are hashed before upload")
+
+
+def test_extra_args_applied_to_content_object():
+    """ContentType/ContentEncoding land on the content object served on download."""
+    service, client = _service()
+    result = service.upload_file(
+        io.BytesIO(b"{}"), "data.json", deduplicate=True,
+        extra_args={"ContentType": "application/json"}
+    )
+    
+    assert client.objects[result["content_key"]]["ContentType"] == "application/json"
+    assert service.get_object("data.json")["ContentType"] == "application/json"
+    print("✓ Extra args applied to the content object")
+
+
+if __name__ == "__main__":
+    test_repeat_upload_skips_transfer()
+    test_download_follows_pointer()
+    test_unseekable_upload_promotes_staging()
+    test_seek_tell_stream_skips_transfer()
+    test_extra_args_applied_to_content_object()
+    print("\n✓ S3Service deduplication tests passed!")
+    sys.exit(0)